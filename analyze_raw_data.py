@@ -38,11 +38,14 @@ def analyze_year_data(year):
         available_months = []
         month_data_counts = {}
         
+        # Count non-zero, non-null values for every month column in one pass
+        present_months = [month for month in fiscal_months if month in df.columns]
+        month_values = df[present_months].apply(pd.to_numeric, errors='coerce')
+        non_zero_counts = ((month_values != 0) & month_values.notna()).sum()
+        
         for month in fiscal_months:
             if month in df.columns:
-                # Count non-zero, non-null values
-                month_values = pd.to_numeric(df[month], errors='coerce')
-                non_zero_count = ((month_values != 0) & month_values.notna()).sum()
+                non_zero_count = non_zero_counts[month]
                 month_data_counts[month] = non_zero_count
                 if non_zero_count > 0:
                     available_months.append(month)
@@ -61,31 +64,26 @@ def analyze_year_data(year):
         tafs_list = df['TAFS'].dropna().unique()
         
         # Check for different fund types based on TAFS patterns
-        current_year_tafs = []
-        multi_year_tafs = []
-        no_year_tafs = []
-        
-        for tafs in tafs_list:
-            tafs_str = str(tafs).strip()
-            if '/X' in tafs_str:
-                no_year_tafs.append(tafs)
-            elif '/' in tafs_str and not tafs_str.endswith('/X'):
-                if tafs_str.count('/') == 1 and not tafs_str.split('/')[-1].strip() == 'X':
-                    parts = tafs_str.split('/')
-                    if len(parts) == 2:
-                        last_part = parts[-1].strip().split(' ')[0]  # Get year part before description
-                        if len(last_part) == 2 and last_part.isdigit():
-                            current_year_tafs.append(tafs)
-                        elif '/' in parts[-1] or len(last_part) > 2:
-                            multi_year_tafs.append(tafs)
-            # Multi-year pattern like "21/25"
-            elif any(f'/{i}' in tafs_str for i in range(10, 30)):
-                multi_year_tafs.append(tafs)
-        
-        print(f"  🎯 Current year funds: {len(current_year_tafs)}")
-        print(f"  📅 Multi-year funds: {len(multi_year_tafs)}")  
-        print(f"  ♾️  No-year funds: {len(no_year_tafs)}")
-        print(f"  ❓ Other/unclear: {len(tafs_list) - len(current_year_tafs) - len(multi_year_tafs) - len(no_year_tafs)}")
+        tafs_str = pd.Series(tafs_list).astype(str).str.strip()
+        
+        # No-year funds like "/X"
+        is_no_year = tafs_str.str.contains('/X', regex=False)
+        
+        # Single-slash TAFS: "/25" is a current year fund, "21/2025" style years are multi-year
+        after_slash = tafs_str.str.split('/', n=1).str[1].fillna('')
+        last_part = after_slash.str.strip().str.split(' ').str[0]  # Get year part before description
+        is_single_slash = (~is_no_year & (tafs_str.str.count('/') == 1) &
+                           (after_slash.str.strip() != 'X'))
+        is_two_digit_year = (last_part.str.len() == 2) & last_part.str.isdigit()
+        
+        current_year_count = int((is_single_slash & is_two_digit_year).sum())
+        multi_year_count = int((is_single_slash & ~is_two_digit_year & (last_part.str.len() > 2)).sum())
+        no_year_count = int(is_no_year.sum())
+        
+        print(f"  🎯 Current year funds: {current_year_count}")
+        print(f"  📅 Multi-year funds: {multi_year_count}")  
+        print(f"  ♾️  No-year funds: {no_year_count}")
+        print(f"  ❓ Other/unclear: {len(tafs_list) - current_year_count - multi_year_count - no_year_count}")
         
         # Check line numbers (budget execution categories)
         print(f"\n📊 LINE NUMBER ANALYSIS:")
@@ -113,9 +111,9 @@ def analyze_year_data(year):
             'unique_agencies': df['AGENCY_TITLE'].nunique(),
             'months_with_data': len(available_months),
             'latest_month': latest_month,
-            'current_year_funds': len(current_year_tafs),
-            'multi_year_funds': len(multi_year_tafs),
-            'no_year_funds': len(no_year_tafs),
+            'current_year_funds': current_year_count,
+            'multi_year_funds': multi_year_count,
+            'no_year_funds': no_year_count,
             'tafs_list': set(tafs_list),
             'file_size_mb': master_file.stat().st_size / 1024 / 1024
         }
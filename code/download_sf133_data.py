@@ -4,19 +4,83 @@ Download SF133 data files from MAX.gov portal.
 Fetches all agency Excel files from the FY 2025 SF 133 report page.
 """
 
-import requests
 from bs4 import BeautifulSoup
 from pathlib import Path
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 import re
 
+try:
+    from code.max_portal import ANCHOR_STRAINER, SF133_BASE_URL, SESSION
+except ImportError:
+    from max_portal import ANCHOR_STRAINER, SF133_BASE_URL, SESSION
+
+# Downloads run concurrently, but request starts stay at least this far apart
+MAX_DOWNLOAD_WORKERS = 8
+MIN_REQUEST_INTERVAL = 1.0
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+class RequestThrottle:
+    """Space out request start times across download threads."""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+    
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def download_excel_file(url, filepath, throttle):
+    """Download a single Excel file, returning (success, output lines)."""
+    lines = [f"    URL: {url}"]
+    
+    try:
+        # Download the file, streaming it to disk in chunks
+        throttle.wait()
+        with SESSION.get(url, timeout=60, stream=True) as file_response:
+            file_response.raise_for_status()
+            chunks = file_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+            first_chunk = next(chunks, b'')
+            
+            # Check if it's actually an Excel file
+            content_type = file_response.headers.get('Content-Type', '')
+            # Excel files start with PK (ZIP format)
+            if not (first_chunk[:2] == b'PK' or 'excel' in content_type or 'spreadsheet' in content_type):
+                lines.append(f"    Failed - not an Excel file (Content-Type: {content_type})")
+                return False, lines
+            
+            # Save to a temporary name so an interrupted download isn't mistaken for a finished one
+            partial_path = filepath.with_name(filepath.name + '.part')
+            size = len(first_chunk)
+            try:
+                with open(partial_path, 'wb') as f:
+                    f.write(first_chunk)
+                    for chunk in chunks:
+                        f.write(chunk)
+                        size += len(chunk)
+            except Exception:
+                partial_path.unlink(missing_ok=True)
+                raise
+            partial_path.replace(filepath)
+        
+        lines.append(f"    Success! Saved {size/1024/1024:.1f} MB")
+        return True, lines
+        
+    except Exception as e:
+        lines.append(f"    ERROR: {str(e)}")
+        return False, lines
+
 def download_sf133_files(target_dir='raw_data/2025', page_url=None):
     """Download all SF133 Excel files from MAX.gov for any fiscal year."""
     
-    # Base URL
-    base_url = "https://portal.max.gov"
-    
     # Default to 2025 if no URL provided
     if page_url is None:
         page_url = "https://portal.max.gov/portal/document/SF133/Budget/FY%202025%20-%20SF%20133%20Reports%20on%20Budget%20Execution%20and%20Budgetary%20Resources.html"
@@ -29,19 +93,15 @@ def download_sf133_files(target_dir='raw_data/2025', page_url=None):
     print(f"Source: {page_url}")
     print()
     
-    # Headers to appear more like a browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     try:
         # Fetch the main page
         print("Fetching main page...")
-        response = requests.get(page_url, headers=headers, timeout=30)
+        response = SESSION.get(page_url, timeout=30)
         response.raise_for_status()
         
         # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.content, 'lxml', parse_only=ANCHOR_STRAINER,
+                             from_encoding=response.encoding or 'utf-8')
         
         # Find all Excel file links - they have .xlsx or .xls in href
         excel_links = []
@@ -52,13 +112,7 @@ def download_sf133_files(target_dir='raw_data/2025', page_url=None):
                 text = link.get_text(strip=True)
                 
                 # Build full URL if relative
-                if not href.startswith('http'):
-                    if href.startswith('/'):
-                        full_url = 'https://portal.max.gov' + href
-                    else:
-                        full_url = urljoin(base_url + '/portal/document/SF133/Budget/', href)
-                else:
-                    full_url = href
+                full_url = urljoin(SF133_BASE_URL, href)
                 
                 # Extract filename from URL
                 filename = href.split('/')[-1]
@@ -109,49 +163,41 @@ def download_sf133_files(target_dir='raw_data/2025', page_url=None):
         skipped = 0
         failed = 0
         
-        for link in excel_links:
-            filename = link['filename']
-            url = link['url']
-            
-            # Get agency name from mapping or use filename
-            agency_name = known_agencies.get(filename, link['description'])
-            
-            filepath = raw_data_dir / filename
-            
-            # Skip if already downloaded
-            if filepath.exists():
-                print(f"  [{downloaded + skipped + failed + 1}/{len(excel_links)}] Already downloaded: {filename} ({agency_name})")
-                skipped += 1
-                continue
+        throttle = RequestThrottle(MIN_REQUEST_INTERVAL)
+        with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+            # Start all missing files, then report in page order as they finish. A filename
+            # listed twice is only fetched once, so no two threads write the same file.
+            downloads = []
+            submitted = set()
+            for link in excel_links:
+                filepath = raw_data_dir / link['filename']
+                future = None
+                if not filepath.exists() and filepath not in submitted:
+                    submitted.add(filepath)
+                    future = executor.submit(download_excel_file, link['url'], filepath, throttle)
+                downloads.append((link, future))
             
-            print(f"  [{downloaded + skipped + failed + 1}/{len(excel_links)}] Downloading: {filename} ({agency_name})")
-            print(f"    URL: {url}")
-            
-            try:
-                # Download the file
-                file_response = requests.get(url, headers=headers, timeout=60)
-                file_response.raise_for_status()
+            for i, (link, future) in enumerate(downloads, 1):
+                filename = link['filename']
+                
+                # Get agency name from mapping or use filename
+                agency_name = known_agencies.get(filename, link['description'])
                 
-                # Check if it's actually an Excel file
-                content_type = file_response.headers.get('Content-Type', '')
-                # Excel files start with PK (ZIP format)
-                if file_response.content[:2] == b'PK' or 'excel' in content_type or 'spreadsheet' in content_type:
-                    # Save the file
-                    with open(filepath, 'wb') as f:
-                        f.write(file_response.content)
-                    
+                # Skip if already downloaded
+                if future is None:
+                    print(f"  [{i}/{len(excel_links)}] Already downloaded: {filename} ({agency_name})")
+                    skipped += 1
+                    continue
+                
+                print(f"  [{i}/{len(excel_links)}] Downloading: {filename} ({agency_name})")
+                success, lines = future.result()
+                for line in lines:
+                    print(line)
+                
+                if success:
                     downloaded += 1
-                    print(f"    Success! Saved {len(file_response.content)/1024/1024:.1f} MB")
                 else:
-                    print(f"    Failed - not an Excel file (Content-Type: {content_type})")
                     failed += 1
-                    
-            except Exception as e:
-                print(f"    ERROR: {str(e)}")
-                failed += 1
-            
-            # Small delay between downloads
-            time.sleep(1)
         
         print(f"\n=== DOWNLOAD SUMMARY ===")
         print(f"Downloaded: {downloaded} files")
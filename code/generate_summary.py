@@ -4,13 +4,47 @@ Generate obligation summary for all agencies from the master SF133 table.
 Creates the final summary CSV and JSON files needed for the web application.
 """
 
+import re
 import pandas as pd
 import numpy as np
 import json
 from pathlib import Path
 
-def parse_tafs_components(tafs, agency_name):
-    """Extract account number, period of performance, and expiration year from TAFS."""
+try:
+    from code.obligation_amounts import compute_obligation_amounts, round_millions
+except ImportError:
+    from obligation_amounts import compute_obligation_amounts, round_millions
+
+# Account number and year token from the code part of an OIA TAFS,
+# e.g. "48-5721 /25", "95-2300 24/25" or "95-2300 /X"
+_OIA_TAFS_RE = re.compile(r'^\s*(?P<account>\S+)(?:\s+(?P<start>\d*)/(?P<end>\d+|X)(?=\s|$))?')
+
+# Master table columns used by the summary; month amount columns are matched by name
+SUMMARY_COLUMNS = {'Agency', 'Line No', 'Col_0', 'Col_1', 'Col_2', 'Col_4', 'Col_6', 'Col_9'}
+# TAFS columns are always text; the bureau/account label columns keep pandas' inferred
+# type so an all-numeric column prints as it always has (e.g. "123.0")
+SUMMARY_DTYPES = {'Agency': 'category', 'Col_4': str, 'Col_6': str, 'Col_9': str}
+_MONTH_COLUMN_RE = re.compile(r'Oct|Nov|Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep')
+
+def format_millions(values):
+    """Format amounts in millions as "$1,234.5M"; NaN/inf become blank."""
+    return values.map('${:,.1f}M'.format).where(np.isfinite(values), '')
+
+def format_percent(values):
+    """Format percentages as "12.3%"; NaN/inf become blank."""
+    return values.map('{:.1f}%'.format).where(np.isfinite(values), '')
+
+def drop_missing_tafs(merged, tafs_col, label_cols):
+    """Report and drop merged rows without a TAFS, which can't be parsed into account components."""
+    missing = merged[tafs_col].isna()
+    agency_col, label_col = label_cols
+    for agency, label in zip(merged.loc[missing, agency_col], merged.loc[missing, label_col]):
+        print(f"    ERROR processing {agency} - {label}: missing TAFS")
+    return merged[~missing]
+
+def parse_tafs_components(tafs):
+    """Extract account number, period of performance, and expiration year from a
+    standard agency TAFS. OIA TAFS are parsed with _OIA_TAFS_RE instead."""
     # Initialize defaults
     account_num = ''
     period_of_perf = ''
@@ -19,78 +53,46 @@ def parse_tafs_components(tafs, agency_name):
     # Split TAFS to get the code part (before any description)
     tafs_parts = tafs.split(' - ')[0] if ' - ' in tafs else tafs
     
-    # Special handling for OIA TAFS format
-    if agency_name == 'Other Independent Agencies':
-        # OIA format examples:
-        # "48-5721 /25 - 400 Years..." -> account: 48-5721, year: 2025
-        # "95-2300 24/25 - Salaries..." -> account: 95-2300, years: 2024-2025
-        parts = tafs_parts.strip().split()
-        if parts:
-            account_num = parts[0]  # First part is account number
-            
-            # Look for year info
-            if len(parts) >= 2:
-                year_part = parts[1]
-                if year_part == '/X':
+    # Parse the TAFS code
+    parts = tafs_parts.split(' ', 1)
+    code_part = parts[0]
+    year_part = parts[1] if len(parts) > 1 else ''
+    
+    # Extract account number
+    code_pieces = code_part.split('-')
+    if len(code_pieces) >= 2:
+        account_num = '-'.join(code_pieces[:3]) if len(code_pieces) >= 3 else '-'.join(code_pieces[:2])
+    
+    # Parse year/period part
+    if year_part:
+        year_part = year_part.strip()
+        if '/' in year_part:
+            if year_part.startswith('/'):
+                # Format: /25 or /X
+                year_val = year_part[1:]
+                if year_val == 'X':
                     period_of_perf = 'No Year'
                     expiration_year = 'No Year'
-                elif '/' in year_part:
-                    if year_part.startswith('/'):
-                        # Single year like "/25"
-                        yr = year_part[1:]
-                        if yr.isdigit():
-                            period_of_perf = f"FY20{yr}"
-                            expiration_year = f"20{yr}"
-                    else:
-                        # Multi-year like "24/25"
-                        yrs = year_part.split('/')
-                        if len(yrs) == 2 and yrs[0].isdigit() and yrs[1].isdigit():
-                            start = f"20{yrs[0]}" if len(yrs[0]) == 2 else yrs[0]
-                            end = f"20{yrs[1]}" if len(yrs[1]) == 2 else yrs[1]
-                            period_of_perf = f"FY{start}-FY{end}"
-                            expiration_year = end
-    else:
-        # Standard agency format
-        # Parse the TAFS code
-        parts = tafs_parts.split(' ', 1)
-        code_part = parts[0]
-        year_part = parts[1] if len(parts) > 1 else ''
-        
-        # Extract account number
-        code_pieces = code_part.split('-')
-        if len(code_pieces) >= 2:
-            account_num = '-'.join(code_pieces[:3]) if len(code_pieces) >= 3 else '-'.join(code_pieces[:2])
-        
-        # Parse year/period part
-        if year_part:
-            year_part = year_part.strip()
-            if '/' in year_part:
-                if year_part.startswith('/'):
-                    # Format: /25 or /X
-                    year_val = year_part[1:]
-                    if year_val == 'X':
-                        period_of_perf = 'No Year'
+                elif year_val.isdigit():
+                    period_of_perf = f"FY20{year_val}"
+                    expiration_year = f"20{year_val}"
+            else:
+                # Format: 21/25 or 25/26
+                period_parts = year_part.split('/')
+                if len(period_parts) == 2:
+                    start_year = period_parts[0]
+                    end_year = period_parts[1]
+                    
+                    if start_year.isdigit() and end_year.isdigit():
+                        start_full = f"20{start_year}" if len(start_year) == 2 else start_year
+                        end_full = f"20{end_year}" if len(end_year) == 2 else end_year
+                        period_of_perf = f"FY{start_full}-FY{end_full}"
+                        expiration_year = end_full
+                    elif end_year == 'X':
+                        start_full = f"20{start_year}" if len(start_year) == 2 else start_year
+                        period_of_perf = f"FY{start_full}-No Year"
                         expiration_year = 'No Year'
-                    elif year_val.isdigit():
-                        period_of_perf = f"FY20{year_val}"
-                        expiration_year = f"20{year_val}"
-                else:
-                    # Format: 21/25 or 25/26
-                    period_parts = year_part.split('/')
-                    if len(period_parts) == 2:
-                        start_year = period_parts[0]
-                        end_year = period_parts[1]
-                        
-                        if start_year.isdigit() and end_year.isdigit():
-                            start_full = f"20{start_year}" if len(start_year) == 2 else start_year
-                            end_full = f"20{end_year}" if len(end_year) == 2 else end_year
-                            period_of_perf = f"FY{start_full}-FY{end_full}"
-                            expiration_year = end_full
-                        elif end_year == 'X':
-                            start_full = f"20{start_year}" if len(start_year) == 2 else start_year
-                            period_of_perf = f"FY{start_full}-No Year"
-                            expiration_year = 'No Year'
-    
+
     return account_num, period_of_perf, expiration_year
 
 def generate_obligation_summary(master_table_path, fiscal_year=None, month=None):
@@ -104,7 +106,12 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     
     # Read the master table
     print("Reading master table...")
-    df = pd.read_csv(master_table_path, low_memory=False)
+    df = pd.read_csv(
+        master_table_path,
+        usecols=lambda col: col in SUMMARY_COLUMNS or bool(_MONTH_COLUMN_RE.search(col)),
+        dtype=SUMMARY_DTYPES,
+        low_memory=False
+    )
     print(f"  Total rows: {len(df):,}")
     print(f"  Agencies: {df['Agency'].nunique()}")
     
@@ -113,14 +120,17 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
         df['Line No'] = pd.to_numeric(df['Line No'], errors='coerce')
     
     # Process each agency type
-    summary_data = []
+    summary_frames = []
+    
+    # Agency is categorical, so this compares integer codes; the mask is reused below
+    is_oia = df['Agency'] == 'Other Independent Agencies'
     
     # Process standard agencies (non-OIA)
-    standard_agencies = df[df['Agency'] != 'Other Independent Agencies'].copy()
+    standard_agencies = df[~is_oia]
     if len(standard_agencies) > 0:
         # Filter for lines 2490 and 2500
-        line_2490 = standard_agencies[standard_agencies['Line No'] == 2490.0].copy()
-        line_2500 = standard_agencies[standard_agencies['Line No'] == 2500.0].copy()
+        line_2490 = standard_agencies[standard_agencies['Line No'] == 2490.0]
+        line_2500 = standard_agencies[standard_agencies['Line No'] == 2500.0]
         
         # Find the latest month column (looking for Aug first, then Jul, etc.)
         month_col = None
@@ -148,57 +158,48 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
             print(f"  Standard agencies - Line 2500: {len(line_2500)} accounts")
             print(f"  After merge: {len(merged)} accounts")
             
-            # Process each row
-            for _, row in merged.iterrows():
-                try:
-                    unob = float(row[f'{month_col}_2490']) / 1_000_000
-                    ba = float(row[f'{month_col}_2500']) / 1_000_000
-                    
-                    if ba == 0:
-                        pct = 0.0 if unob == 0 else 100.0
-                    else:
-                        pct = (unob / ba * 100)
-                    
-                    # Parse TAFS components
-                    account_num, period_of_perf, expiration_year = parse_tafs_components(
-                        row['Col_4'], row['Agency']
-                    )
-                    
-                    # Extract account name from TAFS (preferred) or Col_1 (fallback)
-                    account_name = ''
-                    if ' - ' in str(row['Col_4']):
-                        account_name = str(row['Col_4']).split(' - ', 1)[1]
-                    if not account_name:
-                        account_name = row['Col_1'] if pd.notna(row['Col_1']) else ''
-                    
-                    summary_data.append({
-                        'Agency': row['Agency'],
-                        'Bureau': row['Col_0'] if pd.notna(row['Col_0']) else '',
-                        'Account': account_name,
-                        'Account_Number': account_num,
-                        'Period_of_Performance': period_of_perf,
-                        'Expiration_Year': expiration_year,
-                        'TAFS': row['Col_4'],
-                        'Unobligated_Balance_M': round(unob, 1),
-                        'Budget_Authority_M': round(ba, 1),
-                        'Percentage_Unobligated': round(pct, 1)
-                    })
-                except Exception as e:
-                    print(f"    ERROR processing {row['Agency']} - {row['Col_4']}: {e}")
-                    continue
+            merged = drop_missing_tafs(merged, 'Col_4', ('Agency', 'Col_4'))
+            merged, unob, ba, pct = compute_obligation_amounts(
+                merged, f'{month_col}_2490', f'{month_col}_2500', ('Agency', 'Col_4')
+            )
+            
+            # Parse TAFS components
+            tafs = merged['Col_4'].astype(str)
+            components = [parse_tafs_components(t) for t in tafs]
+            account_num, period_of_perf, expiration_year = (
+                list(values) for values in zip(*components)
+            ) if components else ([], [], [])
+            
+            # Extract account name from TAFS (preferred) or Col_1 (fallback)
+            account_name = tafs.str.split(' - ', n=1).str[1].fillna('')
+            account_name = account_name.where(account_name != '', merged['Col_1'].fillna(''))
+            
+            standard_summary = pd.DataFrame({
+                'Agency': merged['Agency'],
+                'Bureau': merged['Col_0'].fillna(''),
+                'Account': account_name,
+                'Account_Number': account_num,
+                'Period_of_Performance': period_of_perf,
+                'Expiration_Year': expiration_year,
+                'TAFS': merged['Col_4'],
+                'Unobligated_Balance_M': round_millions(unob),
+                'Budget_Authority_M': round_millions(ba),
+                'Percentage_Unobligated': round_millions(pct)
+            })
+            summary_frames.append(standard_summary)
     
     # Process Other Independent Agencies separately
-    oia = df[df['Agency'] == 'Other Independent Agencies'].copy()
+    oia = df[is_oia]
     if len(oia) > 0:
         print(f"\nProcessing Other Independent Agencies ({len(oia)} rows)...")
         
         # OIA uses Col_9 for line numbers (stored as strings like '2490.0')
         # Convert Col_9 to numeric for comparison
-        oia['Col_9_numeric'] = pd.to_numeric(oia['Col_9'], errors='coerce')
+        oia_line_no = pd.to_numeric(oia['Col_9'], errors='coerce')
         
-        # Filter for lines 2490 and 2500
-        line_2490 = oia[oia['Col_9_numeric'] == 2490.0].copy()
-        line_2500 = oia[oia['Col_9_numeric'] == 2500.0].copy()
+        # Filter for lines 2490 and 2500; these slices are only read by the merge
+        line_2490 = oia[oia_line_no == 2490.0]
+        line_2500 = oia[oia_line_no == 2500.0]
         
         print(f"  OIA Line 2490: {len(line_2490)} rows")
         print(f"  OIA Line 2500: {len(line_2500)} rows")
@@ -224,65 +225,60 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
             
             print(f"  OIA After merge: {len(merged_oia)} accounts")
             
-            # Process each OIA row
-            for _, row in merged_oia.iterrows():
-                try:
-                    # Values are in dollars, convert to millions
-                    unob = float(row[f'{amt_col}_2490']) / 1_000_000
-                    ba = float(row[f'{amt_col}_2500']) / 1_000_000
-                    
-                    if ba == 0:
-                        pct = 0.0 if unob == 0 else 100.0
-                    else:
-                        pct = (unob / ba * 100)
-                    
-                    # Parse TAFS and get account info
-                    tafs_full = row['Col_6']  # e.g., "95-2300 /25 - Salaries and Expenses"
-                    
-                    # Extract account name
-                    account_name = ''
-                    if ' - ' in str(tafs_full):
-                        account_name = str(tafs_full).split(' - ', 1)[1]
-                    
-                    # Parse TAFS components
-                    account_num, period_of_perf, expiration_year = parse_tafs_components(
-                        tafs_full, 'Other Independent Agencies'
-                    )
-                    
-                    # Get bureau/agency name
-                    bureau = ''
-                    
-                    # For OIA, bureau info might be in Col_2 after the account number
-                    if pd.notna(row['Col_2']):
-                        # Format: "247-00-5721   400 Years of African-American History Commission"
-                        col2_str = str(row['Col_2']).strip()
-                        parts = col2_str.split(None, 1)  # Split on first whitespace
-                        if len(parts) > 1:
-                            bureau = parts[1].strip()
-                    
-                    # If still no bureau and we have account name from TAFS, use that
-                    if not bureau and account_name:
-                        # The account name might be the bureau for OIA
-                        bureau = account_name
-                    
-                    summary_data.append({
-                        'Agency': 'Other Independent Agencies',
-                        'Bureau': bureau,
-                        'Account': account_name,
-                        'Account_Number': account_num,
-                        'Period_of_Performance': period_of_perf,
-                        'Expiration_Year': expiration_year,
-                        'TAFS': tafs_full,
-                        'Unobligated_Balance_M': round(unob, 1),
-                        'Budget_Authority_M': round(ba, 1),
-                        'Percentage_Unobligated': round(pct, 1)
-                    })
-                except Exception as e:
-                    print(f"    ERROR processing {row['Agency']} - {row['Col_4']}: {e}")
-                    continue
+            merged_oia = drop_missing_tafs(merged_oia, 'Col_6', ('Agency', 'Col_4'))
+            
+            # Values are in dollars, convert to millions
+            merged_oia, unob, ba, pct = compute_obligation_amounts(
+                merged_oia, f'{amt_col}_2490', f'{amt_col}_2500', ('Agency', 'Col_4')
+            )
+            
+            # Parse TAFS and get account info, e.g. "95-2300 /25 - Salaries and Expenses"
+            tafs_full = merged_oia['Col_6'].astype(str)
+            tafs_parts = tafs_full.str.split(' - ', n=1)
+            account_name = tafs_parts.str[1].fillna('')
+            
+            tafs_fields = tafs_parts.str[0].str.extract(_OIA_TAFS_RE).fillna('')
+            start, end = tafs_fields['start'], tafs_fields['end']
+            start_full = start.where(start.str.len() != 2, '20' + start)
+            end_full = end.where(end.str.len() != 2, '20' + end)
+            
+            no_year = (start == '') & (end == 'X')              # "/X"
+            single_year = (start == '') & ~end.isin(['', 'X'])  # "/25"
+            multi_year = (start != '') & ~end.isin(['', 'X'])   # "24/25"
+            period_of_perf = np.select(
+                [no_year, single_year, multi_year],
+                ['No Year', 'FY20' + end, 'FY' + start_full + '-FY' + end_full], ''
+            )
+            expiration_year = np.select(
+                [no_year, single_year, multi_year],
+                ['No Year', '20' + end, end_full], ''
+            )
+            
+            # For OIA, bureau info might be in Col_2 after the account number
+            # Format: "247-00-5721   400 Years of African-American History Commission"
+            # .str[1] is all-NaN float when no value has a second token, so fill before stripping
+            bureau = merged_oia['Col_2'].astype(str).str.strip().str.split(n=1).str[1].fillna('').str.strip()
+            bureau = bureau.where(merged_oia['Col_2'].notna()).fillna('')
+            
+            # If still no bureau, the account name from TAFS might be the bureau for OIA
+            bureau = bureau.where(bureau != '', account_name)
+            
+            oia_summary = pd.DataFrame({
+                'Agency': 'Other Independent Agencies',
+                'Bureau': bureau,
+                'Account': account_name,
+                'Account_Number': tafs_fields['account'],
+                'Period_of_Performance': period_of_perf,
+                'Expiration_Year': expiration_year,
+                'TAFS': merged_oia['Col_6'],
+                'Unobligated_Balance_M': round_millions(unob),
+                'Budget_Authority_M': round_millions(ba),
+                'Percentage_Unobligated': round_millions(pct)
+            })
+            summary_frames.append(oia_summary)
     
     # Create final summary DataFrame
-    summary_df = pd.DataFrame(summary_data)
+    summary_df = pd.concat(summary_frames, ignore_index=True) if summary_frames else pd.DataFrame()
     if len(summary_df) == 0:
         print("ERROR: No valid data found in summary")
         return None
@@ -292,9 +288,9 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     
     # Create formatted output
     output_df = summary_df.copy()
-    output_df['Unobligated Balance (Line 2490)'] = output_df['Unobligated_Balance_M'].apply(lambda x: f'${x:,.1f}M' if pd.notna(x) and not np.isinf(x) else '')
-    output_df['Budget Authority (Line 2500)'] = output_df['Budget_Authority_M'].apply(lambda x: f'${x:,.1f}M' if pd.notna(x) and not np.isinf(x) else '')
-    output_df['Percentage Unobligated'] = output_df['Percentage_Unobligated'].apply(lambda x: f'{x:.1f}%' if pd.notna(x) and not np.isinf(x) else '')
+    output_df['Unobligated Balance (Line 2490)'] = format_millions(output_df['Unobligated_Balance_M'])
+    output_df['Budget Authority (Line 2500)'] = format_millions(output_df['Budget_Authority_M'])
+    output_df['Percentage Unobligated'] = format_percent(output_df['Percentage_Unobligated'])
     
     # Select columns for final output
     final_df = output_df[['Agency', 'Bureau', 'Account', 'Account_Number', 
@@ -315,13 +311,8 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     final_df.to_csv(output_path, index=False)
     print(f"\nSaved summary CSV to: {output_path}")
     
-    # Create JSON for web app
-    json_data = summary_df.copy()
-    
-    # Add formatted columns for consistency with existing web app
-    json_data['Unobligated Balance (Line 2490)'] = json_data['Unobligated_Balance_M'].apply(lambda x: f'${x:,.1f}M' if pd.notna(x) and not np.isinf(x) else '')
-    json_data['Budget Authority (Line 2500)'] = json_data['Budget_Authority_M'].apply(lambda x: f'${x:,.1f}M' if pd.notna(x) and not np.isinf(x) else '')
-    json_data['Percentage Unobligated'] = json_data['Percentage_Unobligated'].apply(lambda x: f'{x:.1f}%' if pd.notna(x) and not np.isinf(x) else '')
+    # Create JSON for web app, reusing the formatted columns for consistency with existing web app
+    json_data = output_df
     
     # Add fiscal year, month, and placeholder time series data
     json_data['Fiscal_Year'] = fiscal_year if fiscal_year else 'Unknown'
@@ -361,9 +352,8 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     print(f"\n=== FILTERING SUMMARY ===")
     
     # Check what was dropped
-    all_2490 = len(df[df['Line No'] == 2490.0]) if 'Line No' in df.columns else 0
-    oia_2490 = len(df[(df['Agency'] == 'Other Independent Agencies') & 
-                      (pd.to_numeric(df['Col_9'], errors='coerce') == 2490.0)]) if 'Col_9' in df.columns else 0
+    all_2490 = (df['Line No'] == 2490.0).sum() if 'Line No' in df.columns else 0
+    oia_2490 = (is_oia & (pd.to_numeric(df['Col_9'], errors='coerce') == 2490.0)).sum() if 'Col_9' in df.columns else 0
     total_2490 = all_2490 + oia_2490
     
     print(f"Total line 2490 accounts in master table: ~{total_2490}")
@@ -377,7 +367,9 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     print(f"Total agencies: {summary_df['Agency'].nunique()}")
     print("\nBy Agency:")
     
-    agency_summary = summary_df.groupby('Agency').agg({
+    # summary_df is already sorted by Agency, so the groups come out in order without a key sort;
+    # Agency can be categorical, so observed=True keeps unused categories out of the summary
+    agency_summary = summary_df.groupby('Agency', sort=False, observed=True).agg({
         'Unobligated_Balance_M': 'sum',
         'Budget_Authority_M': 'sum',
         'TAFS': 'count'
@@ -389,9 +381,12 @@ def generate_obligation_summary(master_table_path, fiscal_year=None, month=None)
     agency_summary = agency_summary.sort_values('Budget_Authority_M', ascending=False)
     
     # Print top agencies
-    for agency, row in agency_summary.head(10).iterrows():
-        print(f"  {agency}: ${row['Budget_Authority_M']:,.1f}M budget, "
-              f"{row['Accounts']} accounts, {row['Percentage']:.1f}% unobligated")
+    top_agencies = agency_summary.head(10)
+    lines = ("  " + top_agencies.index.astype(str) + ": $" +
+             top_agencies['Budget_Authority_M'].map('{:,.1f}'.format) + "M budget, " +
+             top_agencies['Accounts'].astype(str) + " accounts, " +
+             top_agencies['Percentage'].map('{:.1f}'.format) + "% unobligated")
+    print("\n".join(lines))
     
     if len(agency_summary) > 10:
         print(f"  ... and {len(agency_summary) - 10} more agencies")
@@ -0,0 +1,24 @@
+"""
+Shared HTTP setup for fetching SF133 pages and workbooks from the MAX.gov portal.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import SoupStrainer
+
+# Only links are used, so skip building the rest of the page tree
+ANCHOR_STRAINER = SoupStrainer('a', href=True)
+
+# Relative links on the portal pages resolve against this directory
+SF133_BASE_URL = 'https://portal.max.gov/portal/document/SF133/Budget/'
+
+# Shared session so repeated requests to the portal reuse connections
+SESSION = requests.Session()
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+})
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10,
+                       max_retries=Retry(total=3, backoff_factor=0.5))
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
@@ -0,0 +1,50 @@
+"""
+Shared amount handling for the summary scripts: converts merged line 2490/2500
+dollar amounts to millions the same way the original per-row loops did.
+"""
+
+import pandas as pd
+import numpy as np
+
+def compute_obligation_amounts(merged, col_2490, col_2500, label_cols=('Agency', 'TAFS')):
+    """Convert merged line 2490/2500 dollar amounts to millions and compute the
+    percentage unobligated.
+
+    Amounts are parsed with float(), as the per-row loops did; pd.to_numeric only
+    handles the cells it can, and anything it rejects is retried with float().
+    Rows float() also rejects are reported as
+    "ERROR processing <agency> - <tafs>: <reason>" and dropped.
+    """
+    unob_raw = merged[col_2490]
+    ba_raw = merged[col_2500]
+    unob = pd.to_numeric(unob_raw, errors='coerce')
+    ba = pd.to_numeric(ba_raw, errors='coerce')
+
+    # Only values pandas couldn't parse need a closer look
+    invalid = pd.Series(False, index=merged.index)
+    suspect = (unob.isna() & unob_raw.notna()) | (ba.isna() & ba_raw.notna())
+    agency_col, tafs_col = label_cols
+    for idx in merged.index[suspect]:
+        try:
+            unob_value = float(unob_raw[idx])
+            ba_value = float(ba_raw[idx])
+        except Exception as e:
+            print(f"    ERROR processing {merged.at[idx, agency_col]} - {merged.at[idx, tafs_col]}: {e}")
+            invalid[idx] = True
+        else:
+            # Keep what float() parsed, e.g. "1_000", which pd.to_numeric turns into NaN
+            unob[idx] = unob_value
+            ba[idx] = ba_value
+    if invalid.any():
+        merged, unob, ba = merged[~invalid], unob[~invalid], ba[~invalid]
+
+    unob = unob / 1_000_000
+    ba = ba / 1_000_000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(ba == 0, np.where(unob == 0, 0.0, 100.0), unob / ba * 100)
+    return merged, unob, ba, pd.Series(pct, index=unob.index)
+
+def round_millions(values):
+    """Round to one decimal with Python's round(); np.round scales by 10 first
+    and can disagree on values like 0.35."""
+    return values.map(lambda x: round(x, 1))
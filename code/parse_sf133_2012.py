@@ -11,6 +11,11 @@ from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    from code.parse_sf133_raw_data import get_sheet_names
+except ImportError:
+    from parse_sf133_raw_data import get_sheet_names
+
 def detect_file_units_2012(file_path):
     """
     Detect if a 2012 file uses thousands or dollars as units.
@@ -55,26 +60,28 @@ TARGET_AGENCIES = [
     "Other Independent Agencies"
 ]
 
+# Lowercased once rather than for every file's agency lookup
+TARGET_AGENCIES_LOWER = [(agency, agency.lower()) for agency in TARGET_AGENCIES]
+
 def find_agency_from_raw_data(df):
     """Find agency name from Raw Data sheet."""
     if len(df) > 0 and 'AGENCY' in df.columns:
-        # Get the most common agency name (should be consistent across all rows)
-        agency_names = df['AGENCY'].dropna().unique()
-        if len(agency_names) > 0:
-            agency_name = agency_names[0]
+        # Take the first agency name (should be consistent across all rows)
+        first_index = df['AGENCY'].first_valid_index()
+        if first_index is not None:
+            agency_name = df['AGENCY'].loc[first_index]
             
             # Clean up and match against target agencies
             agency_normalized = str(agency_name).replace('--', '-').lower()
-            for target_agency in TARGET_AGENCIES:
-                target_normalized = target_agency.lower()
-                if target_normalized in agency_normalized:
-                    return target_agency
-                # Handle special cases
-                if target_agency == "Department of Defense-Military" and "defense" in agency_normalized and ("military" in agency_normalized or "dod" in agency_normalized):
-                    return target_agency
-                if target_agency == "Corps of Engineers-Civil Works" and "corps of engineers" in agency_normalized and "civil" in agency_normalized:
-                    return target_agency
-                if target_agency == "Other Defense Civil Programs" and "other defense" in agency_normalized and "civil" in agency_normalized:
+            
+            # Handle special cases, checked in the same order as the plain matches
+            special_matches = {
+                "Department of Defense-Military": "defense" in agency_normalized and ("military" in agency_normalized or "dod" in agency_normalized),
+                "Corps of Engineers-Civil Works": "corps of engineers" in agency_normalized and "civil" in agency_normalized,
+                "Other Defense Civil Programs": "other defense" in agency_normalized and "civil" in agency_normalized,
+            }
+            for target_agency, target_normalized in TARGET_AGENCIES_LOWER:
+                if target_normalized in agency_normalized or special_matches.get(target_agency, False):
                     return target_agency
                     
             # If no exact match, return the original name
@@ -88,12 +95,10 @@ def parse_sf133_2012_file(file_path):
     
     try:
         # Check if Raw Data sheet exists
-        xl_file = pd.ExcelFile(file_path, engine='openpyxl')
-        sheet_names = xl_file.sheet_names
+        sheet_names = get_sheet_names(file_path)
         
         if 'Raw Data' not in sheet_names:
             print(f"  No Raw Data sheet found")
-            xl_file.close()
             return None
         
         # Detect units for 2012 files
@@ -104,7 +109,6 @@ def parse_sf133_2012_file(file_path):
         
         if len(df) == 0:
             print(f"  Raw Data sheet is empty")
-            xl_file.close()
             return None
         
         # Apply unit multiplier to numeric columns (amounts)
@@ -138,7 +142,6 @@ def parse_sf133_2012_file(file_path):
             month_column = 'AMT_AUG'
         else:
             print(f"  No recognized month column found in: {df.columns.tolist()}")
-            xl_file.close()
             return None
         
         print(f"  Month: {month_name} (from {month_column})")
@@ -154,14 +157,13 @@ def parse_sf133_2012_file(file_path):
         # Apply TAFS detail equivalent filtering
         # 1. Keep only rows with valid line numbers (LINENO column)  
         if 'LINENO' in df.columns:
-            df = df[df['LINENO'].notna()]
-            print(f"  Rows with line numbers: {len(df)}")
+            # Count rows with a line number; the range filter below drops the rest in the same pass
+            print(f"  Rows with line numbers: {df['LINENO'].notna().sum()}")
             
             # 2. Filter to standard line number ranges that appear in TAFS detail
             numeric_line_nos = pd.to_numeric(df['LINENO'], errors='coerce')
-            standard_lines = df[(numeric_line_nos >= 1000) & (numeric_line_nos <= 9999)]
-            print(f"  Rows with standard line numbers (1000-9999): {len(standard_lines)}")
-            df = standard_lines
+            df = df[numeric_line_nos.between(1000, 9999)]
+            print(f"  Rows with standard line numbers (1000-9999): {len(df)}")
             
             # 3. Aggregate to match TAFS detail level: use only fields needed for final output
             grouping_cols = ['BUREAU', 'OMB_ACCT', 'LINENO']
@@ -188,7 +190,6 @@ def parse_sf133_2012_file(file_path):
         else:
             print(f"  Warning: No LINENO column found")
         
-        xl_file.close()
         return df
         
     except Exception as e:
@@ -294,8 +295,9 @@ def parse_all_sf133_2012_data(source_dir='raw_data/2012'):
         print(f"Successfully processed: {successful_files} files")
         print(f"Total agencies: {len(agencies_processed)}")
         print(f"Agencies found:")
+        agency_counts = month_pivot['Agency'].value_counts()
         for agency in sorted(agencies_processed):
-            count = len(month_pivot[month_pivot['Agency'] == agency])
+            count = agency_counts.get(agency, 0)
             months = sorted(month_data[agency])
             print(f"  - {agency} ({count:,} rows, months: {months})")
         
@@ -4,20 +4,48 @@ Parse SF133 files using Raw Data sheet instead of TAFS detail sheet.
 This should be more reliable and consistent across different file formats and years.
 """
 
+import io
+import os
+import re
+import zipfile
+import contextlib
+import xml.etree.ElementTree as ET
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
-def detect_file_units(file_path):
+# Workbooks are parsed in separate processes; reading Excel is CPU-bound, but each
+# worker holds a whole workbook in memory, so the pool is capped. Set
+# SF133_PARSE_WORKERS to override the cap.
+MAX_PARSE_WORKERS = int(os.environ.get('SF133_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+
+def get_sheet_names(file_path):
+    """
+    List workbook sheet names without loading the workbook.
+    .xlsx files are zip archives, so only xl/workbook.xml is read; anything
+    else goes through openpyxl as before, so legacy .xls files still fail and
+    are skipped rather than parsed.
+    """
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        return [sheet.get('name') for sheet in workbook.iter() if sheet.tag.endswith('}sheet')]
+    except (zipfile.BadZipFile, KeyError):
+        with pd.ExcelFile(file_path, engine='openpyxl') as xl_file:
+            return xl_file.sheet_names
+
+def detect_file_units(xl_file):
     """
     Detect if a file uses thousands or dollars as units by checking the TAFS detail sheet.
+    Takes an open pd.ExcelFile so the workbook is only loaded once per file.
     Returns a multiplier: 1000 for thousands, 1 for dollars.
     """
     try:
         # Check the TAFS detail sheet for unit indicators
-        df_tafs = pd.read_excel(file_path, sheet_name='TAFS detail', engine='openpyxl', nrows=5)
+        df_tafs = xl_file.parse(sheet_name='TAFS detail', nrows=5)
         
         # Convert all text to string and search for unit indicators
         text_content = ' '.join([
@@ -62,6 +90,9 @@ RAW_DATA_COLUMN_MAPPING = {
     'AMT4': 'Sep',  # September = 4th Quarter end (fiscal year end)
 }
 
+# Matches the standardized month (and quarter) columns in the combined output
+MONTH_COLUMN_RE = re.compile(r'Oct|Nov|Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Q')
+
 # List of expected agencies (same as original)
 TARGET_AGENCIES = [
     "Legislative Branch",
@@ -95,26 +126,39 @@ TARGET_AGENCIES = [
     "Other Independent Agencies"
 ]
 
+# Lowercased once rather than for every file's agency lookup
+TARGET_AGENCIES_LOWER = [(agency, agency.lower()) for agency in TARGET_AGENCIES]
+
+def map_unique(values, func):
+    """
+    Apply func once per distinct value and broadcast the results back to every row.
+    TAFS strings and fiscal year fields repeat across many line numbers, so this
+    avoids re-parsing the same value for each row.
+    """
+    codes, uniques = pd.factorize(values)
+    # pd.factorize marks missing values with -1, which picks up the last entry
+    results = [func(value) for value in uniques] + [func(np.nan)]
+    return pd.Series(np.array(results, dtype=object)[codes], index=values.index)
+
 def find_agency_from_raw_data(df):
     """Find agency name from Raw Data sheet."""
     if len(df) > 0 and 'AGENCY' in df.columns:
-        # Get the most common agency name (should be consistent across all rows)
-        agency_names = df['AGENCY'].dropna().unique()
-        if len(agency_names) > 0:
-            agency_name = agency_names[0]
+        # Take the first agency name (should be consistent across all rows)
+        first_index = df['AGENCY'].first_valid_index()
+        if first_index is not None:
+            agency_name = df['AGENCY'].loc[first_index]
             
             # Clean up and match against target agencies
             agency_normalized = str(agency_name).replace('--', '-').lower()
-            for target_agency in TARGET_AGENCIES:
-                target_normalized = target_agency.lower()
-                if target_normalized in agency_normalized:
-                    return target_agency
-                # Handle special cases
-                if target_agency == "Department of Defense-Military" and "defense" in agency_normalized and ("military" in agency_normalized or "dod" in agency_normalized):
-                    return target_agency
-                if target_agency == "Corps of Engineers-Civil Works" and "corps of engineers" in agency_normalized and "civil" in agency_normalized:
-                    return target_agency
-                if target_agency == "Other Defense Civil Programs" and "other defense" in agency_normalized and "civil" in agency_normalized:
+            
+            # Handle special cases, checked in the same order as the plain matches
+            special_matches = {
+                "Department of Defense-Military": "defense" in agency_normalized and ("military" in agency_normalized or "dod" in agency_normalized),
+                "Corps of Engineers-Civil Works": "corps of engineers" in agency_normalized and "civil" in agency_normalized,
+                "Other Defense Civil Programs": "other defense" in agency_normalized and "civil" in agency_normalized,
+            }
+            for target_agency, target_normalized in TARGET_AGENCIES_LOWER:
+                if target_normalized in agency_normalized or special_matches.get(target_agency, False):
                     return target_agency
                     
             # If no exact match, return the original name
@@ -134,23 +178,21 @@ def parse_sf133_raw_data(file_path):
     
     try:
         # Check if Raw Data sheet exists
-        xl_file = pd.ExcelFile(file_path, engine='openpyxl')
-        sheet_names = xl_file.sheet_names
+        sheet_names = get_sheet_names(file_path)
         
         if 'Raw Data' not in sheet_names:
             print(f"  No Raw Data sheet found")
-            xl_file.close()
             return None
         
-        # Detect units before reading Raw Data sheet
-        unit_multiplier = detect_file_units(file_path)
-        
-        # Read Raw Data sheet
-        df = pd.read_excel(file_path, sheet_name='Raw Data')
+        with pd.ExcelFile(file_path) as xl_file:
+            # Detect units before reading Raw Data sheet
+            unit_multiplier = detect_file_units(xl_file)
+            
+            # Read Raw Data sheet
+            df = xl_file.parse(sheet_name='Raw Data')
         
         if len(df) == 0:
             print(f"  Raw Data sheet is empty")
-            xl_file.close()
             return None
         
         print(f"  Raw data dimensions: {df.shape}")
@@ -189,16 +231,15 @@ def parse_sf133_raw_data(file_path):
         # Apply TAFS detail equivalent filtering
         # 1. Keep only rows with valid line numbers (LINENO column)  
         if 'LINENO' in df.columns:
-            df = df[df['LINENO'].notna()]
-            print(f"  Rows with line numbers: {len(df)}")
+            # Count rows with a line number; the range filter below drops the rest in the same pass
+            print(f"  Rows with line numbers: {df['LINENO'].notna().sum()}")
             
             # 2. Filter to standard line number ranges that appear in TAFS detail
             # TAFS detail typically shows line numbers like 1000-5000 range
             # Filter out any unusual/administrative line numbers outside normal budget reporting
             numeric_line_nos = pd.to_numeric(df['LINENO'], errors='coerce')
-            standard_lines = df[(numeric_line_nos >= 1000) & (numeric_line_nos <= 9999)]
-            print(f"  Rows with standard line numbers (1000-9999): {len(standard_lines)}")
-            df = standard_lines
+            df = df[numeric_line_nos.between(1000, 9999)]
+            print(f"  Rows with standard line numbers (1000-9999): {len(df)}")
             
             # 3. Aggregate to match TAFS detail level: derive fiscal year info from TAFS for consistent grouping
             # Group by core fields that create unique TAFS entries for the website
@@ -247,8 +288,8 @@ def parse_sf133_raw_data(file_path):
             
             # Generate derived fiscal year fields from TAFS parsing
             print("  Parsing fiscal year components from TAFS...")
-            df['DERIVED_FY1'] = df['TAFS'].apply(lambda x: parse_tafs_to_match_fy1_fy2(x)[0])
-            df['DERIVED_FY2'] = df['TAFS'].apply(lambda x: parse_tafs_to_match_fy1_fy2(x)[1])
+            df['DERIVED_FY1'] = map_unique(df['TAFS'], lambda x: parse_tafs_to_match_fy1_fy2(x)[0])
+            df['DERIVED_FY2'] = map_unique(df['TAFS'], lambda x: parse_tafs_to_match_fy1_fy2(x)[1])
             
             # LOGGING: Check derived field completeness
             total_records = len(df)
@@ -260,8 +301,8 @@ def parse_sf133_raw_data(file_path):
             # Show examples of derived values
             sample_derived = df[['TAFS', 'DERIVED_FY1', 'DERIVED_FY2']].head(10)
             print(f"  📋 Sample derived values:")
-            for _, row in sample_derived.iterrows():
-                print(f"    TAFS: '{row['TAFS']}' → FY1: '{row['DERIVED_FY1']}', FY2: '{row['DERIVED_FY2']}'")
+            for tafs, fy1, fy2 in zip(sample_derived['TAFS'], sample_derived['DERIVED_FY1'], sample_derived['DERIVED_FY2']):
+                print(f"    TAFS: '{tafs}' → FY1: '{fy1}', FY2: '{fy2}'")
             
             # Check for problematic patterns
             both_empty = ((df['DERIVED_FY1'] == '') & (df['DERIVED_FY2'] == '')).sum()
@@ -308,7 +349,7 @@ def parse_sf133_raw_data(file_path):
                     return ''
             
             print("  Deriving ALLOC from TAFS...")
-            df['DERIVED_ALLOC'] = df['TAFS'].apply(derive_alloc_from_tafs)
+            df['DERIVED_ALLOC'] = map_unique(df['TAFS'], derive_alloc_from_tafs)
             
             # LOGGING: Check ALLOC derivation completeness
             empty_alloc = (df['DERIVED_ALLOC'] == '').sum()
@@ -354,10 +395,10 @@ def parse_sf133_raw_data(file_path):
                         
                     return field_str
                 
-                df['FY1_CLEAN'] = df['FY1'].apply(normalize_fy_field)
-                df['FY2_CLEAN'] = df['FY2'].apply(normalize_fy_field)
-                df['DERIVED_FY1_CLEAN'] = df['DERIVED_FY1'].apply(normalize_fy_field)
-                df['DERIVED_FY2_CLEAN'] = df['DERIVED_FY2'].apply(normalize_fy_field)
+                df['FY1_CLEAN'] = map_unique(df['FY1'], normalize_fy_field)
+                df['FY2_CLEAN'] = map_unique(df['FY2'], normalize_fy_field)
+                df['DERIVED_FY1_CLEAN'] = map_unique(df['DERIVED_FY1'], normalize_fy_field)
+                df['DERIVED_FY2_CLEAN'] = map_unique(df['DERIVED_FY2'], normalize_fy_field)
                 
                 # Find rows where original FY1/FY2 have actual data (not empty/nan)
                 has_fy1_data = (df['FY1_CLEAN'] != '') & (df['FY1_CLEAN'] != 'nan')
@@ -380,13 +421,13 @@ def parse_sf133_raw_data(file_path):
                     
                     if fy1_match_rate < 100:
                         mismatches = df[has_fy1_data & ~fy1_matches][['TAFS', 'FY1_CLEAN', 'DERIVED_FY1_CLEAN']].head(3)
-                        for _, row in mismatches.iterrows():
-                            print(f"       FY1: '{row['FY1_CLEAN']}' vs '{row['DERIVED_FY1_CLEAN']}' from {row['TAFS']}")
+                        for tafs, fy1, derived_fy1 in zip(mismatches['TAFS'], mismatches['FY1_CLEAN'], mismatches['DERIVED_FY1_CLEAN']):
+                            print(f"       FY1: '{fy1}' vs '{derived_fy1}' from {tafs}")
                     
                     if fy2_match_rate < 100:
                         mismatches = df[has_fy2_data & ~fy2_matches][['TAFS', 'FY2_CLEAN', 'DERIVED_FY2_CLEAN']].head(3)
-                        for _, row in mismatches.iterrows():
-                            print(f"       FY2: '{row['FY2_CLEAN']}' vs '{row['DERIVED_FY2_CLEAN']}' from {row['TAFS']}")
+                        for tafs, fy2, derived_fy2 in zip(mismatches['TAFS'], mismatches['FY2_CLEAN'], mismatches['DERIVED_FY2_CLEAN']):
+                            print(f"       FY2: '{fy2}' vs '{derived_fy2}' from {tafs}")
                     
                     raise ValueError("TAFS parsing validation failed - derived fields do not match FY1/FY2")
                 
@@ -399,8 +440,8 @@ def parse_sf133_raw_data(file_path):
                 print("  🔍 Validating ALLOC derivation against existing ALLOC field...")
                 
                 # Clean and normalize ALLOC fields for comparison
-                df['ALLOC_CLEAN'] = df['ALLOC'].apply(normalize_fy_field)
-                df['DERIVED_ALLOC_CLEAN'] = df['DERIVED_ALLOC'].apply(normalize_fy_field)
+                df['ALLOC_CLEAN'] = map_unique(df['ALLOC'], normalize_fy_field)
+                df['DERIVED_ALLOC_CLEAN'] = map_unique(df['DERIVED_ALLOC'], normalize_fy_field)
                 
                 # Find rows where original ALLOC has actual data (not empty/nan)
                 has_alloc_data = (df['ALLOC_CLEAN'] != '') & (df['ALLOC_CLEAN'] != 'nan')
@@ -418,8 +459,8 @@ def parse_sf133_raw_data(file_path):
                     print("     Showing mismatches:")
                     
                     mismatches = df[has_alloc_data & ~alloc_matches][['TAFS', 'ALLOC_CLEAN', 'DERIVED_ALLOC_CLEAN']].head(3)
-                    for _, row in mismatches.iterrows():
-                        print(f"       ALLOC: '{row['ALLOC_CLEAN']}' vs '{row['DERIVED_ALLOC_CLEAN']}' from {row['TAFS']}")
+                    for tafs, alloc, derived_alloc in zip(mismatches['TAFS'], mismatches['ALLOC_CLEAN'], mismatches['DERIVED_ALLOC_CLEAN']):
+                        print(f"       ALLOC: '{alloc}' vs '{derived_alloc}' from {tafs}")
                     
                     raise ValueError("ALLOC derivation validation failed - derived ALLOC does not match existing ALLOC")
                 
@@ -467,7 +508,9 @@ def parse_sf133_raw_data(file_path):
                     print(f"    📊 Records after NaN filter: {after_filter:,}")
                 
                 # Show expected vs actual grouping behavior
-                unique_groups_before = df_filtered.groupby(grouping_cols).ngroups
+                # Group once; the same grouper serves the count here and the aggregation below
+                grouped = df_filtered.groupby(grouping_cols, as_index=False)
+                unique_groups_before = grouped.ngroups
                 print(f"    🎯 Expected output groups: {unique_groups_before:,}")
                 print(f"    📈 Aggregation ratio: {after_filter/unique_groups_before:.1f} records per group")
                 
@@ -493,7 +536,7 @@ def parse_sf133_raw_data(file_path):
                 
                 # Group and aggregate
                 print(f"    🔄 Performing aggregation...")
-                df = df_filtered.groupby(grouping_cols, as_index=False).agg(agg_dict)
+                df = grouped.agg(agg_dict)
                 print(f"    ✅ AGGREGATION COMPLETE:")
                 print(f"      📊 Output records: {len(df):,}")
                 print(f"      📉 Compression ratio: {after_filter/len(df):.1f}:1 (input:output)")
@@ -508,21 +551,35 @@ def parse_sf133_raw_data(file_path):
                 print(f"    📋 Sample grouped records:")
                 sample_cols = ['BUREAU', 'OMB_ACCT', 'DERIVED_FY1', 'DERIVED_FY2', 'DERIVED_ALLOC']
                 available_cols = [col for col in sample_cols if col in df.columns]
-                for i, (_, row) in enumerate(df[available_cols].head(5).iterrows()):
-                    print(f"      {i+1}. {dict(row)}")
+                for i, record in enumerate(df[available_cols].head(5).to_dict('records')):
+                    print(f"      {i+1}. {record}")
                 
                 print(f"  📊 Final aggregated data: {len(df):,} records (was {before_filter:,})")
             
         else:
             print(f"  Warning: No LINENO column found")
         
-        xl_file.close()
         return df
         
     except Exception as e:
         print(f"  Error processing {file_path}: {str(e)}")
         return None
 
+def parse_file_with_output(file_path):
+    """
+    Parse one file in a worker process, capturing what it prints so the parent
+    can report each file's output in order. Returns (df, output, error).
+    """
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            df = parse_sf133_raw_data(file_path)
+            error = None
+        except Exception as e:
+            df = None
+            error = str(e)
+    return df, buffer.getvalue(), error
+
 def parse_all_sf133_raw_data(source_dir='raw_data/august'):
     """Process all SF 133 files using Raw Data sheets."""
     sf133_dir = Path(source_dir)
@@ -540,19 +597,21 @@ def parse_all_sf133_raw_data(source_dir='raw_data/august'):
     successful_files = 0
     agencies_processed = set()
     
-    for file_path in excel_files:
-        try:
-            df = parse_sf133_raw_data(file_path)
-            if df is not None and len(df) > 0:
+    with ProcessPoolExecutor(max_workers=max(1, min(MAX_PARSE_WORKERS, len(excel_files)))) as executor:
+        # Results come back in file order, so the log reads the same as a serial run
+        results = executor.map(parse_file_with_output, excel_files)
+        for file_path, (df, output, error) in zip(excel_files, results):
+            print(output, end='')
+            if error is not None:
+                print(f"  Error processing {file_path.name}: {error}")
+            elif df is not None and len(df) > 0:
                 all_data.append(df)
                 successful_files += 1
                 agencies_processed.add(df['Agency'].iloc[0])
                 print(f"  Success: {len(df)} rows")
             else:
                 print(f"  Skipping - no data extracted")
-        except Exception as e:
-            print(f"  Error processing {file_path.name}: {str(e)}")
-        print()
+            print()
     
     # Combine all data
     if all_data:
@@ -574,7 +633,11 @@ def parse_all_sf133_raw_data(source_dir='raw_data/august'):
         text_columns = ['TAFS', 'BUREAU', 'AGENCY_TITLE', 'BUREAU_TITLE', 'OMB_ACCOUNT', 'LINE_DESC']
         for col in text_columns:
             if col in combined_df.columns:
-                combined_df[col] = combined_df[col].apply(clean_text_field)
+                # Names repeat on every line number, so clean each distinct string once;
+                # converting to str first keeps values like 1 and 1.0 apart
+                values = combined_df[col]
+                values = values.where(values.isna(), values.astype(str))
+                combined_df[col] = map_unique(values, clean_text_field)
         
         # Save the master table
         output_path = Path('site/data/sf133_raw_data_master.csv')
@@ -585,14 +648,15 @@ def parse_all_sf133_raw_data(source_dir='raw_data/august'):
         print(f"Successfully processed: {successful_files} files")
         print(f"Total agencies: {len(agencies_processed)}")
         print(f"Agencies found:")
+        agency_counts = combined_df['Agency'].value_counts()
         for agency in sorted(agencies_processed):
-            count = len(combined_df[combined_df['Agency'] == agency])
+            count = agency_counts.get(agency, 0)
             print(f"  - {agency} ({count:,} rows)")
         print(f"\nTotal rows: {len(combined_df):,}")
         print(f"Raw data master table saved to: {output_path}")
         
         # Show available month columns
-        month_columns = [col for col in combined_df.columns if any(month in col for month in ['Oct', 'Nov', 'Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Q'])]
+        month_columns = [col for col in combined_df.columns if MONTH_COLUMN_RE.search(col)]
         print(f"\nAvailable month columns: {month_columns}")
         
         return output_path
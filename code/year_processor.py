@@ -19,6 +19,7 @@ import numpy as np
 from pathlib import Path
 import json
 import argparse
+import re
 import sys
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -27,6 +28,41 @@ warnings.filterwarnings('ignore')
 
 from code.download_sf133_data import download_sf133_files
 from code.parse_sf133_raw_data import parse_all_sf133_raw_data
+from create_year_summaries import create_year_summary
+
+# Column name fragments that identify each quarter's column, one regex per quarter
+QUARTER_COLUMN_PATTERNS = {
+    quarter: re.compile('|'.join(re.escape(pattern) for pattern in patterns))
+    for quarter, patterns in {
+        'Q1': ['Dec (1Q)', 'Dec', 'AMT1', '1Q', 'Q1'],
+        'Q2': ['Mar (2Q)', 'Mar', 'AMT2', '2Q', 'Q2'],
+        'Q3': ['Jun (3Q)', 'Jun', 'AMT3', '3Q', 'Q3'],
+        'Q4': ['Sep (4Q)', 'Sep', 'AMT4', '4Q', 'Q4'],
+    }.items()
+}
+
+# Per-agency TAFS counts for the baseline master CSV, keyed on (path, mtime_ns, size);
+# only the latest entry is kept, and counts are stored as immutable tuples
+_BASELINE_TAFS_COUNTS = {}
+
+def _baseline_tafs_counts(path: Path, baseline_df: Optional[pd.DataFrame] = None):
+    """
+    Count unique TAFS per agency in the baseline master CSV, reading it only when
+    the counts aren't cached and the caller hasn't already loaded the frame.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _BASELINE_TAFS_COUNTS:
+        if baseline_df is None:
+            baseline_df = pd.read_csv(path, low_memory=False)
+        counts = None
+        if 'TAFS' in baseline_df.columns and 'Agency' in baseline_df.columns:
+            tafs_by_agency = baseline_df.groupby('Agency')['TAFS'].nunique().to_dict()
+            counts = tuple(tafs_by_agency.items()), baseline_df['TAFS'].nunique()
+        _BASELINE_TAFS_COUNTS.clear()
+        _BASELINE_TAFS_COUNTS[key] = counts
+    return _BASELINE_TAFS_COUNTS[key]
 
 class SF133YearProcessor:
     """Process complete fiscal year of SF133 data."""
@@ -132,7 +168,9 @@ class SF133YearProcessor:
             
             # Load baseline TAFS data (use 2025 as benchmark if available)
             print("🔍 DEBUG: Loading baseline TAFS data...")
-            baseline_tafs = self._load_baseline_tafs_data()
+            # When this year is the baseline, count its TAFS from the frame already loaded
+            is_baseline = data_path.resolve() == self._baseline_file().resolve()
+            baseline_tafs = self._load_baseline_tafs_data(df if is_baseline else None)
             print(f"🔍 DEBUG: Baseline loaded: {bool(baseline_tafs.get('tafs_by_agency'))}")
             
             # Fiscal Year Quarter Mapping
@@ -158,32 +196,35 @@ class SF133YearProcessor:
             quarter_data = {}
             
             # Check individual month columns
-            for month in ALL_MONTHS:
-                matching_cols = [col for col in df.columns if col == month]
-                if matching_cols:
-                    total = df[matching_cols[0]].sum()
-                    month_data[month] = {
-                        'column': matching_cols[0],
-                        'total': total,
-                        'has_data': abs(total) > 1000
-                    }
+            present_months = [month for month in ALL_MONTHS if month in df.columns]
             
             # Check quarterly columns with flexible naming patterns
             quarter_cols = {
-                'Q1': [col for col in df.columns if any(pattern in col for pattern in ['Dec (1Q)', 'Dec', 'AMT1', '1Q', 'Q1'])],
-                'Q2': [col for col in df.columns if any(pattern in col for pattern in ['Mar (2Q)', 'Mar', 'AMT2', '2Q', 'Q2'])], 
-                'Q3': [col for col in df.columns if any(pattern in col for pattern in ['Jun (3Q)', 'Jun', 'AMT3', '3Q', 'Q3'])],
-                'Q4': [col for col in df.columns if any(pattern in col for pattern in ['Sep (4Q)', 'Sep', 'AMT4', '4Q', 'Q4'])]
+                quarter: [col for col in df.columns if pattern.search(col)]
+                for quarter, pattern in QUARTER_COLUMN_PATTERNS.items()
             }
             
             # Filter out individual month columns that were already captured above
+            month_columns = set(present_months)
             for quarter, cols in quarter_cols.items():
                 # Remove columns that are already captured as individual months
-                quarter_cols[quarter] = [col for col in cols if col not in [data['column'] for data in month_data.values()]]
+                quarter_cols[quarter] = [col for col in cols if col not in month_columns]
+            
+            # Total every month and quarter column in one pass over the frame
+            total_columns = list(dict.fromkeys(present_months + [cols[0] for cols in quarter_cols.values() if cols]))
+            column_totals = df[total_columns].sum()
+            
+            for month in present_months:
+                total = column_totals[month]
+                month_data[month] = {
+                    'column': month,
+                    'total': total,
+                    'has_data': abs(total) > 1000
+                }
             
             for quarter, cols in quarter_cols.items():
                 if cols:
-                    total = df[cols[0]].sum()
+                    total = column_totals[cols[0]]
                     quarter_data[quarter] = {
                         'column': cols[0], 
                         'total': total,
@@ -279,12 +320,17 @@ class SF133YearProcessor:
             print(f"⚠️ Analysis failed: {e}")
             return False
     
-    def _load_baseline_tafs_data(self) -> dict:
-        """Load baseline TAFS account data for comparison (always use FY2025 as benchmark)."""
+    def _baseline_file(self) -> Path:
+        """Master CSV used as the TAFS benchmark (always FY2025)."""
+        return self.site_data_dir / 'sf133_2025_master.csv'
+    
+    def _load_baseline_tafs_data(self, baseline_df: Optional[pd.DataFrame] = None) -> dict:
+        """Load baseline TAFS account data for comparison (always use FY2025 as benchmark).
+        Pass baseline_df when the FY2025 master is already loaded to avoid reading it again."""
         baseline = {'tafs_by_agency': {}, 'total_accounts': 0}
         
         # Always use FY2025 as the baseline for TAFS validation
-        baseline_file = self.site_data_dir / 'sf133_2025_master.csv'
+        baseline_file = self._baseline_file()
         baseline_year = 2025
         
         if not baseline_file.exists():
@@ -292,15 +338,15 @@ class SF133YearProcessor:
             return baseline
         
         try:
-            baseline_df = pd.read_csv(baseline_file, low_memory=False)
+            # Every year is validated against the same counts, so they are computed once per run
+            counts = _baseline_tafs_counts(baseline_file, baseline_df)
             
             # Extract unique TAFS accounts by agency
-            if 'TAFS' in baseline_df.columns and 'Agency' in baseline_df.columns:
-                tafs_by_agency = baseline_df.groupby('Agency')['TAFS'].nunique().to_dict()
-                total_accounts = baseline_df['TAFS'].nunique()
+            if counts is not None:
+                tafs_by_agency, total_accounts = counts
                 
                 baseline = {
-                    'tafs_by_agency': tafs_by_agency,
+                    'tafs_by_agency': dict(tafs_by_agency),
                     'total_accounts': total_accounts,
                     'baseline_year': baseline_year,
                     'baseline_file': baseline_file.name
@@ -329,7 +375,8 @@ class SF133YearProcessor:
             print("❌ Missing TAFS or Agency columns for validation")
             return False, {}
         
-        current_tafs_by_agency = df.groupby('Agency')['TAFS'].nunique().to_dict()
+        # Only looked up by agency, so the group order doesn't matter
+        current_tafs_by_agency = df.groupby('Agency', sort=False)['TAFS'].nunique().to_dict()
         current_total = df['TAFS'].nunique()
         
         # Calculate coverage by agency
@@ -394,39 +441,24 @@ class SF133YearProcessor:
         print(f"\n📊 GENERATING SUMMARY FILES FOR FY{year}")
         print("=" * 60)
         
+        master_file = self.site_data_dir / f"sf133_{year}_master.csv"
+        if not master_file.exists():
+            print(f"❌ Master file not found: {master_file}")
+            return False
+        
+        # Run in-process rather than spawning a new interpreter
         try:
-            import subprocess
-            import sys
-            
-            # Path to the summary script
-            summary_script = self.base_dir / "create_year_summaries.py"
-            
-            if not summary_script.exists():
-                print(f"❌ Summary script not found: {summary_script}")
-                return False
-            
-            # Run the summary generation script for this specific year
-            cmd = [sys.executable, str(summary_script), "--year", str(year)]
-            print(f"Running: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(self.base_dir))
-            
-            if result.returncode == 0:
-                print("✅ Summary generation completed successfully")
-                if result.stdout:
-                    print(result.stdout)
-                return True
-            else:
-                print(f"❌ Summary generation failed (exit code: {result.returncode})")
-                if result.stderr:
-                    print(f"Error: {result.stderr}")
-                if result.stdout:
-                    print(f"Output: {result.stdout}")
-                return False
-                
+            output_path = create_year_summary(master_file, year, output_dir=self.site_data_dir)
         except Exception as e:
             print(f"❌ Error running summary generation: {e}")
             return False
+        
+        if output_path:
+            print("✅ Summary generation completed successfully")
+            return True
+        
+        print("❌ Summary generation failed")
+        return False
     
     def process_complete_year(self, year: int, url: str = None, download: bool = True) -> bool:
         """Complete pipeline to download and process a full fiscal year."""
@@ -473,7 +505,6 @@ def main():
     
     if args.all_years:
         # Process all available years
-        import os
         raw_data_dir = processor.raw_data_dir
         
         if not raw_data_dir.exists():
@@ -10,19 +10,20 @@ import json
 import sys
 from pathlib import Path
 
+from code.obligation_amounts import compute_obligation_amounts, round_millions
+
 def find_all_months_with_data(df):
     """Find all months with data in the dataframe."""
     # Define month order (fiscal year: Oct -> Sep)
     fiscal_months = ['Oct', 'Nov', 'Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep']
     
     # Check which month columns exist and have data
-    available_months = []
-    for month in fiscal_months:
-        if month in df.columns:
-            # Check if this month has non-zero, non-null data
-            month_data = pd.to_numeric(df[month], errors='coerce')
-            if month_data.notna().any() and (month_data != 0).any():
-                available_months.append(month)
+    present_months = [month for month in fiscal_months if month in df.columns]
+    
+    # Check if each month has non-zero, non-null data, testing all month columns at once
+    month_data = df[present_months].apply(pd.to_numeric, errors='coerce')
+    has_data = month_data.notna().any() & (month_data != 0).any()
+    available_months = [month for month in present_months if has_data[month]]
     
     print(f"  Months with data: {', '.join(available_months)}")
     return available_months
@@ -123,7 +124,7 @@ def create_monthly_summaries(master_file_path, fiscal_year):
     
     # Read the master table
     print("Reading master table...")
-    df = pd.read_csv(master_file_path, low_memory=False)
+    df = pd.read_csv(master_file_path, engine='pyarrow')
     print(f"  Total rows: {len(df):,}")
     print(f"  Agencies: {df['Agency'].nunique()}")
     
@@ -138,90 +139,91 @@ def create_monthly_summaries(master_file_path, fiscal_year):
     
     output_files = []
     
+    # The agency split, line filters, merge and TAFS parsing don't depend on the month,
+    # so do them once for all months and pick out each month's columns in the loop
+    standard_agencies = df[df['Agency'] != 'Other Independent Agencies']
+    line_2490 = standard_agencies[standard_agencies['LINENO'] == 2490.0]
+    line_2500 = standard_agencies[standard_agencies['LINENO'] == 2500.0]
+    
+    merged_all = None
+    if len(line_2490) > 0 and len(line_2500) > 0:
+        merged_all = pd.merge(
+            line_2490[['Agency', 'BUREAU', 'TAFS'] + available_months],
+            line_2500[['Agency', 'TAFS'] + available_months], 
+            on=['Agency', 'TAFS'], 
+            suffixes=('_2490', '_2500')
+        )
+        
+        # Parse TAFS components
+        components = [
+            parse_tafs_components(tafs, agency)
+            for tafs, agency in zip(merged_all['TAFS'], merged_all['Agency'])
+        ]
+        account_num, period_of_perf, expiration_year = (
+            list(values) for values in zip(*components)
+        ) if components else ([], [], [])
+        merged_all['Account_Number'] = account_num
+        merged_all['Period_of_Performance'] = period_of_perf
+        merged_all['Expiration_Year'] = expiration_year
+        
+        # Extract account name from TAFS (after ' - ')
+        merged_all['Account'] = merged_all['TAFS'].astype(str).str.split(' - ', n=1).str[1].fillna('')
+    
+    oia = df[df['Agency'] == 'Other Independent Agencies']
+    
     # Process each month
     for month in available_months:
         print(f"\n--- Processing {month} {fiscal_year} ---")
         
         # Process each agency type
-        summary_data = []
+        summary_df = pd.DataFrame()
         
         # Process standard agencies (non-OIA)
-        standard_agencies = df[df['Agency'] != 'Other Independent Agencies'].copy()
         if len(standard_agencies) > 0:
-            # Filter for lines 2490 and 2500
-            line_2490 = standard_agencies[standard_agencies['LINENO'] == 2490.0].copy()
-            line_2500 = standard_agencies[standard_agencies['LINENO'] == 2500.0].copy()
-            
             print(f"  Standard agencies - Line 2490: {len(line_2490)} accounts")
             print(f"  Standard agencies - Line 2500: {len(line_2500)} accounts")
             
             # Merge on TAFS
-            if len(line_2490) > 0 and len(line_2500) > 0:
-                merged = pd.merge(
-                    line_2490[['Agency', 'BUREAU', 'TAFS', month]],
-                    line_2500[['Agency', 'TAFS', month]], 
-                    on=['Agency', 'TAFS'], 
-                    suffixes=('_2490', '_2500')
-                )
+            if merged_all is not None:
+                merged = merged_all[['Agency', 'BUREAU', 'TAFS', 'Account', 'Account_Number',
+                                     'Period_of_Performance', 'Expiration_Year',
+                                     f'{month}_2490', f'{month}_2500']]
                 
                 print(f"  After merge: {len(merged)} accounts")
                 
-                # Process each row
-                for _, row in merged.iterrows():
-                    try:
-                        unob = float(row[f'{month}_2490']) / 1_000_000
-                        ba = float(row[f'{month}_2500']) / 1_000_000
-                        
-                        # Skip if both values are zero or very small
-                        if abs(unob) < 0.001 and abs(ba) < 0.001:
-                            continue
-                        
-                        if ba == 0:
-                            pct = 0.0 if unob == 0 else 100.0
-                        else:
-                            pct = (unob / ba * 100)
-                        
-                        # Parse TAFS components
-                        account_num, period_of_perf, expiration_year = parse_tafs_components(
-                            row['TAFS'], row['Agency']
-                        )
-                        
-                        # Extract account name from TAFS (after ' - ')
-                        account_name = ''
-                        if ' - ' in str(row['TAFS']):
-                            account_name = str(row['TAFS']).split(' - ', 1)[1]
-                        
-                        summary_data.append({
-                            'Month': month,
-                            'Fiscal_Year': fiscal_year,
-                            'Agency': row['Agency'],
-                            'Bureau': row['BUREAU'] if pd.notna(row['BUREAU']) else '',
-                            'Account': account_name,
-                            'Account_Number': account_num,
-                            'Period_of_Performance': period_of_perf,
-                            'Expiration_Year': expiration_year,
-                            'TAFS': row['TAFS'],
-                            'Unobligated_Balance_M': round(unob, 1),
-                            'Budget_Authority_M': round(ba, 1),
-                            'Percentage_Unobligated': round(pct, 1)
-                        })
-                    except Exception as e:
-                        print(f"    ERROR processing {row['Agency']} - {row['TAFS']}: {e}")
-                        continue
+                merged, unob, ba, pct = compute_obligation_amounts(
+                    merged, f'{month}_2490', f'{month}_2500'
+                )
+                
+                # Skip if both values are zero or very small
+                keep = ~((unob.abs() < 0.001) & (ba.abs() < 0.001))
+                merged, unob, ba, pct = merged[keep], unob[keep], ba[keep], pct[keep]
+                
+                summary_df = pd.DataFrame({
+                    'Month': month,
+                    'Fiscal_Year': fiscal_year,
+                    'Agency': merged['Agency'],
+                    'Bureau': merged['BUREAU'].fillna(''),
+                    'Account': merged['Account'],
+                    'Account_Number': merged['Account_Number'],
+                    'Period_of_Performance': merged['Period_of_Performance'],
+                    'Expiration_Year': merged['Expiration_Year'],
+                    'TAFS': merged['TAFS'],
+                    'Unobligated_Balance_M': round_millions(unob),
+                    'Budget_Authority_M': round_millions(ba),
+                    'Percentage_Unobligated': round_millions(pct)
+                })
         
         # Process Other Independent Agencies separately (if any)
-        oia = df[df['Agency'] == 'Other Independent Agencies'].copy()
         if len(oia) > 0:
             print(f"  Processing Other Independent Agencies ({len(oia)} rows)...")
             # Add OIA processing here if needed - similar to above but adapted for OIA structure
         
-        # Create summary DataFrame for this month
-        if len(summary_data) == 0:
+        # Check the summary DataFrame for this month
+        if len(summary_df) == 0:
             print(f"  WARNING: No valid data found for {month}")
             continue
         
-        summary_df = pd.DataFrame(summary_data)
-        
         # Sort by Agency and Budget Authority
         summary_df = summary_df.sort_values(['Agency', 'Budget_Authority_M'], ascending=[True, False])
         
@@ -9,19 +9,20 @@ import json
 import sys
 from pathlib import Path
 
+from code.obligation_amounts import compute_obligation_amounts, round_millions
+
 def find_latest_month(df):
     """Find the latest month with data in the dataframe."""
     # Define month order (fiscal year: Oct -> Sep)
     fiscal_months = ['Oct', 'Nov', 'Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep']
     
     # Check which month columns exist and have data
-    available_months = []
-    for month in reversed(fiscal_months):  # Start from latest (Sep) and go backwards
-        if month in df.columns:
-            # Check if this month has non-zero, non-null data
-            month_data = pd.to_numeric(df[month], errors='coerce')
-            if month_data.notna().any() and (month_data != 0).any():
-                available_months.append(month)
+    present_months = [month for month in fiscal_months if month in df.columns]
+    
+    # Check if each month has non-zero, non-null data, testing all month columns at once
+    month_data = df[present_months].apply(pd.to_numeric, errors='coerce')
+    has_data = month_data.notna().any() & (month_data != 0).any()
+    available_months = [month for month in reversed(present_months) if has_data[month]]  # Start from latest (Sep) and go backwards
     
     if available_months:
         latest_month = available_months[0]  # First in reversed list = latest
@@ -118,8 +119,9 @@ def parse_tafs_components(tafs, agency_name):
     
     return account_num, period_of_perf, expiration_year
 
-def create_year_summary(master_file_path, fiscal_year):
-    """Create obligation summary from a year-specific master SF133 file."""
+def create_year_summary(master_file_path, fiscal_year, output_dir='site/data'):
+    """Create obligation summary from a year-specific master SF133 file.
+    Output files are written to output_dir (site/data by default)."""
     
     print(f"\n{'='*80}")
     print(f"Processing FY{fiscal_year} - {master_file_path.name}")
@@ -127,7 +129,7 @@ def create_year_summary(master_file_path, fiscal_year):
     
     # Read the master table
     print("Reading master table...")
-    df = pd.read_csv(master_file_path, low_memory=False)
+    df = pd.read_csv(master_file_path, engine='pyarrow')
     print(f"  Total rows: {len(df):,}")
     print(f"  Agencies: {df['Agency'].nunique()}")
     
@@ -141,7 +143,7 @@ def create_year_summary(master_file_path, fiscal_year):
     df['LINENO'] = pd.to_numeric(df['LINENO'], errors='coerce')
     
     # Process each agency type
-    summary_data = []
+    summary_df = pd.DataFrame()
     
     # Process standard agencies (non-OIA)
     standard_agencies = df[df['Agency'] != 'Other Independent Agencies'].copy()
@@ -164,42 +166,34 @@ def create_year_summary(master_file_path, fiscal_year):
             
             print(f"  After merge: {len(merged)} accounts")
             
-            # Process each row
-            for _, row in merged.iterrows():
-                try:
-                    unob = float(row[f'{latest_month}_2490']) / 1_000_000
-                    ba = float(row[f'{latest_month}_2500']) / 1_000_000
-                    
-                    if ba == 0:
-                        pct = 0.0 if unob == 0 else 100.0
-                    else:
-                        pct = (unob / ba * 100)
-                    
-                    # Parse TAFS components
-                    account_num, period_of_perf, expiration_year = parse_tafs_components(
-                        row['TAFS'], row['Agency']
-                    )
-                    
-                    # Extract account name from TAFS (after ' - ')
-                    account_name = ''
-                    if ' - ' in str(row['TAFS']):
-                        account_name = str(row['TAFS']).split(' - ', 1)[1]
-                    
-                    summary_data.append({
-                        'Agency': row['Agency'],
-                        'Bureau': row['BUREAU'] if pd.notna(row['BUREAU']) else '',
-                        'Account': account_name,
-                        'Account_Number': account_num,
-                        'Period_of_Performance': period_of_perf,
-                        'Expiration_Year': expiration_year,
-                        'TAFS': row['TAFS'],
-                        'Unobligated_Balance_M': round(unob, 1),
-                        'Budget_Authority_M': round(ba, 1),
-                        'Percentage_Unobligated': round(pct, 1)
-                    })
-                except Exception as e:
-                    print(f"    ERROR processing {row['Agency']} - {row['TAFS']}: {e}")
-                    continue
+            merged, unob, ba, pct = compute_obligation_amounts(
+                merged, f'{latest_month}_2490', f'{latest_month}_2500'
+            )
+            
+            # Parse TAFS components
+            components = [
+                parse_tafs_components(tafs, agency)
+                for tafs, agency in zip(merged['TAFS'], merged['Agency'])
+            ]
+            account_num, period_of_perf, expiration_year = (
+                list(values) for values in zip(*components)
+            ) if components else ([], [], [])
+            
+            # Extract account name from TAFS (after ' - ')
+            account_name = merged['TAFS'].astype(str).str.split(' - ', n=1).str[1].fillna('')
+            
+            summary_df = pd.DataFrame({
+                'Agency': merged['Agency'],
+                'Bureau': merged['BUREAU'].fillna(''),
+                'Account': account_name,
+                'Account_Number': account_num,
+                'Period_of_Performance': period_of_perf,
+                'Expiration_Year': expiration_year,
+                'TAFS': merged['TAFS'],
+                'Unobligated_Balance_M': round_millions(unob),
+                'Budget_Authority_M': round_millions(ba),
+                'Percentage_Unobligated': round_millions(pct)
+            })
     
     # Process Other Independent Agencies separately (if any)
     oia = df[df['Agency'] == 'Other Independent Agencies'].copy()
@@ -207,8 +201,7 @@ def create_year_summary(master_file_path, fiscal_year):
         print(f"\nProcessing Other Independent Agencies ({len(oia)} rows)...")
         # Add OIA processing here if needed - similar to above but adapted for OIA structure
     
-    # Create final summary DataFrame
-    summary_df = pd.DataFrame(summary_data)
+    # Check the final summary DataFrame
     if len(summary_df) == 0:
         print("ERROR: No valid data found in summary")
         return None
@@ -230,7 +223,7 @@ def create_year_summary(master_file_path, fiscal_year):
     
     # Save CSV output
     output_filename = f'all_agencies_obligation_summary_{fiscal_year}.csv'
-    output_path = Path(f'site/data/{output_filename}')
+    output_path = Path(output_dir) / output_filename
     output_path.parent.mkdir(parents=True, exist_ok=True)
     final_df.to_csv(output_path, index=False)
     print(f"\n✅ Saved summary CSV to: {output_path}")
@@ -250,12 +243,12 @@ def create_year_summary(master_file_path, fiscal_year):
     
     # Save JSON
     json_filename = f'all_agencies_summary_{fiscal_year}.json'
-    json_path = Path(f'site/data/{json_filename}')
+    json_path = Path(output_dir) / json_filename
     json_data.to_json(json_path, orient='records')
     print(f"✅ Saved JSON for web app to: {json_path}")
     
     # Create/update metadata file with fiscal year -> month mapping
-    metadata_path = Path('site/data/fiscal_year_metadata.json')
+    metadata_path = Path(output_dir) / 'fiscal_year_metadata.json'
     metadata = {}
     
     # Load existing metadata if it exists
@@ -6,11 +6,14 @@ Key requirement: Previous years should have comprehensive account data, current
 """
 
 import json
+import re
 import pandas as pd
 import os
 import sys
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # Expected agencies list
 EXPECTED_AGENCIES = [
@@ -45,6 +48,8 @@ EXPECTED_AGENCIES = [
     "Other Independent Agencies"
 ]
 
+EXPECTED_AGENCIES_SET = frozenset(EXPECTED_AGENCIES)
+
 # Known data gaps - agencies that are expected to be missing for specific years
 # Format: {year: [list of agency names that are known to be missing]}
 KNOWN_EXCEPTIONS = {
@@ -56,6 +61,59 @@ KNOWN_EXCEPTIONS = {
     ]
 }
 
+MAIN_SUMMARY_PATH = Path('site/data/all_agencies_obligation_summary.csv')
+REQUIRED_SUMMARY_COLUMNS = ('Agency', 'Bureau', 'Account')
+
+@lru_cache(maxsize=None)
+def _load_summary_csv(path_str):
+    df = pd.read_csv(path_str, engine='pyarrow')
+    # ~30 distinct agencies, so unique()/nunique() across tests only touch the categories
+    if 'Agency' in df.columns:
+        df['Agency'] = df['Agency'].astype('category')
+    return df
+
+def read_summary_csv(csv_path):
+    """Read an obligation summary CSV using the multithreaded pyarrow parser.
+    Each file is parsed once and shared between tests, so callers must not modify it."""
+    return _load_summary_csv(str(Path(csv_path)))
+
+def prefetch_summary_csvs():
+    """Parse all obligation summary CSVs concurrently so the tests read them from cache"""
+    def prefetch(csv_file):
+        try:
+            read_summary_csv(csv_file)
+        except Exception:
+            pass  # Left for the individual tests to report
+    
+    csv_files = list(Path('site/data').glob('all_agencies_obligation_summary*.csv'))
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(prefetch, csv_files))
+
+# Currency/percentage formatting characters, e.g. "$1,234.5M" or "12.3%"
+_FORMATTED_NUMBER_RE = re.compile(r'[$,M%]')
+
+def parse_formatted_values(values):
+    """Convert formatted currency/percentage strings to floats in a single pass"""
+    return values.str.replace(_FORMATTED_NUMBER_RE, '', regex=True).astype(float)
+
+# Formatted values that were produced from NaN, e.g. "$nanM" or "nan%"
+_INVALID_VALUE_RE = re.compile(r'\$?nanM|nan%')
+_FORMATTED_COLUMN_KEYWORDS = ('Balance', 'Authority', 'Percentage', 'Unobligated')
+
+def find_invalid_formatted_values(df):
+    """Return (column, count) for the first formatted column containing nanM/nan%, else None"""
+    for col in df.columns:
+        if any(keyword in col for keyword in _FORMATTED_COLUMN_KEYWORDS):
+            values = df[col].astype(str)
+            # Cheap substring test first; clean columns never reach the regex
+            maybe_invalid = values.str.contains('nan', na=False, regex=False)
+            if not maybe_invalid.any():
+                continue
+            invalid_values = values[maybe_invalid].str.contains(_INVALID_VALUE_RE, na=False)
+            if invalid_values.any():
+                return col, invalid_values.sum()
+    return None
+
 def test_year_data_completeness():
     """Test that we have required data for each fiscal year"""
     print("Testing fiscal year data completeness...")
@@ -92,11 +150,11 @@ def test_year_data_completeness():
         year_passed = True
         
         try:
-            df = pd.read_csv(csv_path)
+            df = read_summary_csv(csv_path)
             
             # Check agency coverage
             agencies_found = set(df['Agency'].unique())
-            missing_agencies = set(EXPECTED_AGENCIES) - agencies_found
+            missing_agencies = EXPECTED_AGENCIES_SET - agencies_found
             
             # Apply known exceptions for this year
             if year in KNOWN_EXCEPTIONS:
@@ -109,10 +167,10 @@ def test_year_data_completeness():
             # Special handling for "Other Independent Agencies" - may be broken out individually in some years
             if "Other Independent Agencies" in missing_agencies:
                 # Check if we have individual independent agencies instead
-                independent_agencies = [a for a in agencies_found if a not in EXPECTED_AGENCIES]
+                independent_agencies = [a for a in agencies_found if a not in EXPECTED_AGENCIES_SET]
                 if len(independent_agencies) > 0:
                     print(f"    ✅ {len(agencies_found)} agencies present (Other Independent Agencies broken out as: {independent_agencies[:3]}{'...' if len(independent_agencies) > 3 else ''})")
-                    missing_agencies.discard("Other Independent Agencies")
+                    missing_agencies -= {"Other Independent Agencies"}
                 else:
                     print(f"    ❌ Missing Other Independent Agencies and no individual independent agencies found")
             
@@ -175,28 +233,25 @@ def test_csv_summary_files():
     
     for csv_file in csv_files:
         try:
-            df = pd.read_csv(csv_file)
+            df = read_summary_csv(csv_file)
             
             # Basic validation
             if len(df) == 0:
                 print(f"❌ ERROR: {csv_file.name} is empty")
                 return False
             
-            required_columns = ['Agency', 'Bureau', 'Account']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in REQUIRED_SUMMARY_COLUMNS if col not in df.columns]
             
             if missing_columns:
                 print(f"❌ ERROR: {csv_file.name} missing columns: {missing_columns}")
                 return False
             
             # Check for invalid formatted values (nanM, nan%)
-            for col in df.columns:
-                if df[col].dtype == 'object':  # String columns
-                    invalid_values = df[col].astype(str).str.contains(r'\$nanM|nan%|nanM|nan\%', na=False, regex=True)
-                    if invalid_values.any():
-                        invalid_count = invalid_values.sum()
-                        print(f"❌ ERROR: {csv_file.name} contains {invalid_count} invalid values (nanM/nan%) in column '{col}'")
-                        return False
+            invalid = find_invalid_formatted_values(df)
+            if invalid:
+                col, invalid_count = invalid
+                print(f"❌ ERROR: {csv_file.name} contains {invalid_count} invalid values (nanM/nan%) in column '{col}'")
+                return False
             
             print(f"✅ {csv_file.name}: {len(df)} rows, {len(df.columns)} columns")
             
@@ -213,14 +268,12 @@ def test_csv_summary_files():
                 df = pd.read_csv(csv_file, nrows=1000)  # Sample first 1000 rows
                 
                 # Check for invalid formatted values (nanM, nan%)
-                for col in df.columns:
-                    if df[col].dtype == 'object':  # String columns
-                        invalid_values = df[col].astype(str).str.contains(r'\$nanM|nan%|nanM|nan\%', na=False, regex=True)
-                        if invalid_values.any():
-                            invalid_count = invalid_values.sum()
-                            print(f"❌ ERROR: {csv_file.name} contains {invalid_count} invalid values (nanM/nan%) in column '{col}'")
-                            return False
-                            
+                invalid = find_invalid_formatted_values(df)
+                if invalid:
+                    col, invalid_count = invalid
+                    print(f"❌ ERROR: {csv_file.name} contains {invalid_count} invalid values (nanM/nan%) in column '{col}'")
+                    return False
+                    
             except Exception as e:
                 print(f"❌ ERROR: Failed to read {csv_file}: {e}")
                 return False
@@ -233,14 +286,14 @@ def test_data_consistency():
     """Test that data is consistent across years"""
     print("\nTesting data consistency...")
     
-    # Load the main obligation summary
-    main_file = Path('site/data/all_agencies_obligation_summary.csv')
+    # Load the main obligation summary (shared with test_data_reasonableness)
+    main_file = MAIN_SUMMARY_PATH
     if not main_file.exists():
         print("❌ ERROR: Main obligation summary file not found")
         return False
     
     try:
-        df = pd.read_csv(main_file)
+        df = read_summary_csv(main_file)
         
         # Check for reasonable number of records
         if len(df) < 1000:
@@ -276,20 +329,20 @@ def test_data_reasonableness():
     """Test that the data values are reasonable across years"""
     print("\nTesting data reasonableness...")
     
-    # Load main summary file
-    main_file = Path('site/data/all_agencies_obligation_summary.csv')
+    # Load main summary file (already parsed by test_data_consistency)
+    main_file = MAIN_SUMMARY_PATH
     if not main_file.exists():
         print("❌ ERROR: Main summary file not found")
         return False
     
     try:
-        df = pd.read_csv(main_file)
+        df = read_summary_csv(main_file)
         
         # Test budget authority and unobligated balance values
         if 'Budget Authority (Line 2500)' in df.columns:
             # Parse currency values like "$1,234.5M"
-            ba_values = df['Budget Authority (Line 2500)'].str.replace('$', '').str.replace(',', '').str.replace('M', '').astype(float)
-            unob_values = df['Unobligated Balance (Line 2490)'].str.replace('$', '').str.replace(',', '').str.replace('M', '').astype(float)
+            ba_values = parse_formatted_values(df['Budget Authority (Line 2500)'])
+            unob_values = parse_formatted_values(df['Unobligated Balance (Line 2490)'])
             
             # Check for reasonable totals (should be in trillions)
             total_ba = ba_values.sum() / 1000  # Convert to billions
@@ -303,7 +356,7 @@ def test_data_reasonableness():
             
             # Check percentage calculations
             if 'Percentage Unobligated' in df.columns:
-                pct_values = df['Percentage Unobligated'].str.replace('%', '').astype(float)
+                pct_values = parse_formatted_values(df['Percentage Unobligated'])
                 extreme_pct = pct_values[(pct_values < -1000) | (pct_values > 1000)]
                 
                 if len(extreme_pct) > 0:
@@ -334,7 +387,12 @@ def test_cross_year_consistency():
                 year = int(year_str)
                 years.append(year)
                 try:
-                    year_data[year] = pd.read_csv(csv_file)
+                    df = read_summary_csv(csv_file)
+                    # Keep only what the comparisons need: agency set and total budget authority
+                    year_data[year] = (
+                        set(df['Agency'].unique()),
+                        parse_formatted_values(df['Budget Authority (Line 2500)']).sum()
+                    )
                 except Exception as e:
                     print(f"❌ Failed to load FY{year} data: {e}")
                     return False
@@ -347,10 +405,10 @@ def test_cross_year_consistency():
     print(f"✅ Comparing {len(years)} years of data: {years}")
     
     # Compare agency consistency across years
-    baseline_agencies = set(year_data[years[0]]['Agency'].unique())
+    baseline_agencies = year_data[years[0]][0]
     
     for year in years[1:]:
-        current_agencies = set(year_data[year]['Agency'].unique())
+        current_agencies = year_data[year][0]
         
         # New agencies are OK, but major losses are concerning
         missing_agencies = baseline_agencies - current_agencies
@@ -364,9 +422,9 @@ def test_cross_year_consistency():
     for i in range(len(years) - 1):
         prev_year, curr_year = years[i], years[i + 1]
         
-        # Get total budget authority for each year
-        prev_ba = year_data[prev_year]['Budget Authority (Line 2500)'].str.replace('$', '').str.replace(',', '').str.replace('M', '').astype(float).sum()
-        curr_ba = year_data[curr_year]['Budget Authority (Line 2500)'].str.replace('$', '').str.replace(',', '').str.replace('M', '').astype(float).sum()
+        # Total budget authority for each year
+        prev_ba = year_data[prev_year][1]
+        curr_ba = year_data[curr_year][1]
         
         if prev_ba > 0:
             change_pct = ((curr_ba - prev_ba) / prev_ba) * 100
@@ -391,6 +449,10 @@ def main():
     # Change to the repository root
     os.chdir(Path(__file__).parent)
     
+    # File parsing dominates the run time; do it in parallel up front and keep
+    # the tests themselves sequential so their output stays readable
+    prefetch_summary_csvs()
+    
     tests = [
         test_year_data_completeness,
         test_csv_summary_files,
@@ -4,11 +4,19 @@ Scrape SF133 URLs from MAX.gov portal pages and update sf133_urls.json.
 This script finds all available fiscal year links from the main SF133 page.
 """
 
-import requests
 from bs4 import BeautifulSoup
 import json
 import re
 from pathlib import Path
+from urllib.parse import urljoin
+
+from code.max_portal import ANCHOR_STRAINER, SF133_BASE_URL, SESSION
+
+# Fiscal year links are recognised either by their text or by their URL
+FY_TEXT_RE = re.compile(r'FY\s*(\d{4})', re.IGNORECASE)
+FY_HREF_RE = re.compile(r'FY%20(\d{4})')
+SF133_TEXT = 'SF 133'
+SF133_HREF = 'SF%20133'
 
 def scrape_sf133_urls():
     """Scrape all available SF133 URLs from the FACTS II portal page."""
@@ -16,10 +24,6 @@ def scrape_sf133_urls():
     # Main page with all fiscal years
     facts_url = "https://portal.max.gov/portal/document/SF133/Budget/FACTS%20II%20-%20SF%20133%20Report%20on%20Budget%20Execution%20and%20Budgetary%20Resources.html"
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     print("Scraping SF133 URLs from FACTS II page...")
     print(f"Source: {facts_url}")
     print()
@@ -29,53 +33,42 @@ def scrape_sf133_urls():
     
     try:
         # Fetch the FACTS II page
-        response = requests.get(facts_url, headers=headers, timeout=30)
+        response = SESSION.get(facts_url, timeout=30)
         response.raise_for_status()
         
         # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.content, 'lxml', parse_only=ANCHOR_STRAINER,
+                             from_encoding=response.encoding or 'utf-8')
         
-        # Find all links that contain "FY" and "SF 133"
+        # Single pass over the links: text matches are used as found, URL
+        # pattern matches only fill in years the link text didn't cover
+        url_pattern_links = {}
         for link in soup.find_all('a', href=True):
             href = link['href']
             text = link.get_text(strip=True)
             
+            text_match = FY_TEXT_RE.search(text) if SF133_TEXT in text else None
+            href_match = FY_HREF_RE.search(href) if SF133_HREF in href else None
+            if not text_match and not href_match:
+                continue
+            
+            # Build full URL if relative
+            full_url = urljoin(SF133_BASE_URL, href)
+            
             # Look for fiscal year links
-            fy_match = re.search(r'FY\s*(\d{4})', text, re.IGNORECASE)
-            if fy_match and 'SF 133' in text:
-                year = fy_match.group(1)
-                
-                # Build full URL if relative
-                if not href.startswith('http'):
-                    if href.startswith('/'):
-                        full_url = 'https://portal.max.gov' + href
-                    else:
-                        full_url = 'https://portal.max.gov/portal/document/SF133/Budget/' + href
-                else:
-                    full_url = href
-                
+            if text_match:
+                year = text_match.group(1)
                 sf133_links[year] = full_url
                 print(f"Found FY {year}: {text}")
+            
+            # Also check for any direct URL patterns in href attributes
+            if href_match:
+                url_pattern_links.setdefault(href_match.group(1), full_url)
         
-        # Also check for any direct URL patterns in href attributes
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            # Look for FY pattern in URLs
-            fy_match = re.search(r'FY%20(\d{4})', href)
-            if fy_match and 'SF%20133' in href:
-                year = fy_match.group(1)
-                
-                if not href.startswith('http'):
-                    if href.startswith('/'):
-                        full_url = 'https://portal.max.gov' + href
-                    else:
-                        full_url = 'https://portal.max.gov/portal/document/SF133/Budget/' + href
-                else:
-                    full_url = href
-                
-                if year not in sf133_links:
-                    sf133_links[year] = full_url
-                    print(f"Found FY {year} (from URL pattern)")
+        for year, full_url in url_pattern_links.items():
+            if year not in sf133_links:
+                sf133_links[year] = full_url
+                print(f"Found FY {year} (from URL pattern)")
                     
     except Exception as e:
         print(f"WARNING: Web scraping failed - {e}")